@@ -0,0 +1,118 @@
+"""
+SQLite cache of routine IDs that have already been notified
+Keeps track of which routines were seen in previous runs
+"""
+
+import sqlite3
+import os
+import atexit
+import logging
+
+# Azure Functions persists /home/data between invocations
+DATA_DIRECTORY = os.getenv('DATA_DIRECTORY', '/home/data')
+DATABASE_PATH = os.path.join(DATA_DIRECTORY, 'routine_cache.db')
+
+# One connection per process - opening the database on the mounted share
+# is expensive, so reuse it across calls instead of connect/close per query
+_conn = None
+
+
+def get_conn():
+    """
+    Return the shared connection, opening it lazily on first use.
+    """
+    global _conn
+    if _conn is None:
+        os.makedirs(DATA_DIRECTORY, exist_ok=True)
+        _conn = sqlite3.connect(DATABASE_PATH, isolation_level=None, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.execute('PRAGMA temp_store=MEMORY')
+    return _conn
+
+
+def _close_conn():
+    if _conn is not None:
+        _conn.close()
+
+
+atexit.register(_close_conn)
+
+
+# True once the schema has been checked, so warm invocations skip the DDL
+_initialized = False
+
+
+def init_database():
+    """
+    Create the routine_ids table if it doesn't exist.
+    Runs the DDL once per process; later calls are a no-op.
+    """
+    global _initialized
+    if _initialized:
+        return
+    get_conn().execute('''
+        CREATE TABLE IF NOT EXISTS routine_ids (
+            routine_id TEXT PRIMARY KEY NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    get_conn().execute('''
+        CREATE TABLE IF NOT EXISTS feed_meta (
+            key TEXT PRIMARY KEY NOT NULL,
+            value TEXT
+        )
+    ''')
+    _initialized = True
+    logging.info("Database ready at %s", DATABASE_PATH)
+
+
+def lastroutine():
+    """
+    Return all cached routine IDs as a set in one query.
+    Callers only use the result for membership checks, so no ordering.
+    """
+    cursor = get_conn().execute('SELECT routine_id FROM routine_ids')
+    return {row[0] for row in cursor}
+
+
+def get_feed_meta():
+    """
+    Return stored feed validators (etag / last_modified) as a dict.
+    """
+    cursor = get_conn().execute('SELECT key, value FROM feed_meta')
+    return dict(cursor)
+
+
+def set_feed_meta(etag, last_modified):
+    """
+    Persist the feed validators from the latest successful fetch.
+    """
+    values = [(k, v) for k, v in (('etag', etag), ('last_modified', last_modified)) if v]
+    if values:
+        get_conn().executemany('INSERT OR REPLACE INTO feed_meta (key, value) VALUES (?, ?)', values)
+
+
+def updatecache_bulk(new_ids):
+    """
+    Add a batch of routine IDs to the cache in a single transaction,
+    so a burst of new routines costs one fsync instead of one per insert.
+    """
+    if not new_ids:
+        return
+    conn = get_conn()
+    changes_before = conn.total_changes
+    conn.execute('BEGIN')
+    try:
+        conn.executemany(
+            'INSERT OR IGNORE INTO routine_ids (routine_id) VALUES (?)',
+            [(new_id,) for new_id in new_ids]
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    # The change counter tells us how many rows were actually new,
+    # without re-querying the table
+    inserted = conn.total_changes - changes_before
+    logging.info("Cached %d routine IDs (%d already present)", inserted, len(new_ids) - inserted)
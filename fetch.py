@@ -4,25 +4,81 @@ Parses RSS feed and sends email notifications for new routines
 """
 
 import traceback
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone
 from urllib.parse import quote_plus
-from sendMail import sendMail, ChangeClientSecret
+from zoneinfo import ZoneInfo
+from db_init import init_database, lastroutine, updatecache_bulk, get_feed_meta, set_feed_meta
 import os
-from babel.dates import format_date
+from functools import lru_cache
 import re
-import feedparser
+from email.utils import parsedate_to_datetime
 import logging
 
+# Heavy third-party imports (lxml, requests, sendMail's msal) are
+# done inside the functions that need them to keep cold starts short
+
 # Constants
-NORWEGIAN_TIMEZONE_OFFSET_HOURS = 2
+NORWEGIAN_TIMEZONE = ZoneInfo("Europe/Oslo")  # handles CET/CEST shifts
+MAX_ENTRIES = 50  # Entries arrive newest-first, no need to look further back
 NEW_ROUTINE_THRESHOLD_HOURS = 7 * 24  # 7 days
-EXPIRATION_WARNING_3_WEEKS_MIN = 420   # 2.5 weeks in hours
-EXPIRATION_WARNING_3_WEEKS_MAX = 588   # 3.5 weeks in hours
-EXPIRATION_WARNING_2_WEEKS_MIN = 252   # 1.5 weeks in hours
-EXPIRATION_WARNING_CRITICAL = 252      # Under 1.5 weeks
+EXPIRATION_WARNING_3_WEEKS_MIN = 17    # ~2.5 weeks in days
+EXPIRATION_WARNING_3_WEEKS_MAX = 24    # ~3.5 weeks in days
+EXPIRATION_WARNING_2_WEEKS_MIN = 10    # ~1.5 weeks in days
+
+# Warning label per remaining-days threshold, checked top-down
+_EXPIRATION_WARNING_LEVELS = (
+    (EXPIRATION_WARNING_3_WEEKS_MIN, '3 week'),
+    (EXPIRATION_WARNING_2_WEEKS_MIN, '2 week'),
+    (float('-inf'), 'Under 1.5 week'),
+)
 
 # Characters to keep: letters, numbers, spaces, Norwegian chars (æøåÆØÅ), and slash (/)
-ALLOWED_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 æøåÆØÅ/')
+# Compiled once; sub() strips everything else in a single C-level pass
+_DISALLOWED_RE = re.compile(r'[^a-zA-Z0-9 æøåÆØÅ/]')
+
+# Extracts the numeric post ID from WordPress guid URLs like ...?p=1234
+_ID_RE = re.compile(r'p=(\d+)$')
+
+
+def _extract_post_id(entry_id):
+    """
+    Pull the numeric post ID off guid URLs like ...?p=1234.
+    rpartition covers the normal format without the regex engine;
+    the precompiled regex stays as the fallback.
+    """
+    tail = entry_id.rpartition('p=')[2]
+    if tail.isdigit():
+        return tail
+    match = _ID_RE.search(entry_id)
+    return match.group(1) if match else None
+
+# Characters that force the full quote_plus path
+_URL_SPECIALS = re.compile(r'[%&=?#+/]')
+
+# Static prefix of the routine search URL, built once
+_SEARCH_BASE = "https://quality.k2kompetanse.no/rutiner/?_kurs_sok="
+
+
+def _quote_plus_fast(text):
+    """
+    quote_plus with a fast path: pure-ASCII titles without reserved
+    characters come out unchanged except spaces, a single C-level replace.
+    """
+    if text.isascii() and not _URL_SPECIALS.search(text):
+        return text.replace(' ', '+')
+    return quote_plus(text)
+
+# Abbreviated Norwegian month names, matching CLDR 'nb' output for MMM
+_NB_MONTHS = ('jan.', 'feb.', 'mars', 'apr.', 'mai', 'juni',
+              'juli', 'aug.', 'sep.', 'okt.', 'nov.', 'des.')
+
+
+@lru_cache(maxsize=1)
+def _parse_expiration_date(raw):
+    """
+    Parse CLIENT_SECRET_EXPIRATION_DATE once; the env var rarely changes.
+    """
+    return datetime.strptime(raw.strip('"'), '%m/%d/%Y')
 
 
 def sanitize_for_search(text):
@@ -30,57 +86,49 @@ def sanitize_for_search(text):
     Sanitize text for use in search URL by removing special characters.
     Keeps letters, numbers, spaces, Norwegian characters, and slash.
     """
-    result = ''.join(char for char in text if char in ALLOWED_CHARS)
+    result = _DISALLOWED_RE.sub('', text)
     # Remove multiple spaces and trim
     result = ' '.join(result.split())
     return result
 
 
-def format_course_data(entry):
+def format_course_data(entry, now_norwegian):
     """
     Format RSS entry into structured routine data.
-    Extracts title, Norwegian time (+2 hours), and creates proper search URL.
+    Extracts title, Norwegian time (Europe/Oslo), and creates proper search URL.
+    `now_norwegian` is computed once per run and shared across entries.
     """
-    title = entry.title.strip()
-    entry_id = entry.id
+    title = entry['title'].strip()
+    entry_id = entry['id']
 
     # Extract numeric ID from the end of the URL
-    match = re.search(r'p=(\d+)$', entry_id)
-    numeric_id = match.group(1) if match else None
-    logging.info(f"  → Formatting routine: {title} (ID: {numeric_id})")
-
-    # Parse published date and convert to Norwegian time
-    published_date_utc = None
-    if hasattr(entry, 'published_parsed') and entry.published_parsed:
-        published_date_utc = datetime(*entry.published_parsed[:6], tzinfo=timezone.utc)
-    elif hasattr(entry, 'published'):
-        try:
-            published_date_utc = datetime.fromisoformat(entry.published.replace('Z', '+00:00'))
-        except (ValueError, AttributeError):
-            published_date_utc = datetime.now(timezone.utc)
-    else:
-        published_date_utc = datetime.now(timezone.utc)
+    numeric_id = _extract_post_id(entry_id)
+    logging.debug("  → Formatting routine: %s (ID: %s)", title, numeric_id)
 
-    current_norwegian_time = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=NORWEGIAN_TIMEZONE_OFFSET_HOURS)
-    logging.info(f"Current Norwegian time: {current_norwegian_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    # Parse the RFC 822 pubDate and convert to Norwegian time
+    try:
+        published_date_utc = parsedate_to_datetime(entry['published'])
+        if published_date_utc.tzinfo is None:
+            published_date_utc = published_date_utc.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        published_date_utc = datetime.now(timezone.utc)
 
     # Convert to Norwegian time
-    norwegian_time = published_date_utc + timedelta(hours=NORWEGIAN_TIMEZONE_OFFSET_HOURS)
+    norwegian_time = published_date_utc.astimezone(NORWEGIAN_TIMEZONE)
 
     # Create the search URL with sanitized and encoded title
     sanitized_title = sanitize_for_search(title)
-    encoded_title = quote_plus(sanitized_title)
-    search_url = f"https://quality.k2kompetanse.no/rutiner/?_kurs_sok={encoded_title}"
+    encoded_title = _quote_plus_fast(sanitized_title)
+    search_url = _SEARCH_BASE + encoded_title
 
-    date_part = format_date(norwegian_time, format='d. MMM yyyy', locale='nb')
-    time_part = norwegian_time.strftime('%H:%M')
-    formatted_date = f"{date_part}, kl {time_part}"
+    formatted_date = (f"{norwegian_time.day}. {_NB_MONTHS[norwegian_time.month - 1]} "
+                      f"{norwegian_time.year}, kl {norwegian_time.hour:02d}:{norwegian_time.minute:02d}")
 
     routine_data = {
         'id': numeric_id,
         'title': title,
         'published_norwegian': norwegian_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'current_norwegian_time': current_norwegian_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'current_norwegian_time': now_norwegian.strftime('%Y-%m-%d %H:%M:%S'),
         'published_iso': norwegian_time.isoformat(),
         'search_url': search_url,
         'encoded_title': encoded_title,
@@ -90,35 +138,12 @@ def format_course_data(entry):
     return routine_data
 
 
-def is_new_routine(routine_data):
+def is_new_routine(routine_data, cached_ids):
     """
-    Check if this routine was posted in the last 7 days.
+    Check if this routine has already been cached in a previous run.
+    `cached_ids` is the set of routine IDs loaded once per run.
     """
-    # Parse the routine's Norwegian publication time
-    routine_published = datetime.fromisoformat(routine_data['published_iso'])
-
-    # Remove timezone info for comparison (both are in Norwegian time)
-    routine_published_naive = routine_published.replace(tzinfo=None)
-
-    # Get current Norwegian time
-    current_norwegian_time = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=NORWEGIAN_TIMEZONE_OFFSET_HOURS)
-
-    # Calculate time difference
-    time_diff = current_norwegian_time - routine_published_naive
-    hours_since_published = time_diff.total_seconds() / 3600
-
-    logging.info(f"  → Routine '{routine_data['title']}' published at {routine_published_naive}")
-    logging.info(f"  → Current time: {current_norwegian_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    logging.info(f"  → Hours since published: {hours_since_published:.2f}")
-
-    # Check if routine was published in the last 7 days
-    if hours_since_published <= NEW_ROUTINE_THRESHOLD_HOURS:
-        logging.info(f"  → This routine is NEW! (published {hours_since_published:.2f} hours ago)")
-        logging.info(f"  → Search URL: {routine_data['search_url']}")
-        return True
-    else:
-        logging.info(f"  → This routine is too old (published {hours_since_published:.2f} hours ago)")
-        return False
+    return routine_data['id'] not in cached_ids
 
 
 def callMailFunction(routines):
@@ -126,14 +151,16 @@ def callMailFunction(routines):
     Send all new routines in a single email.
     """
     try:
-        logging.info(f"Sending {len(routines)} new routines to support mail...")
+        from sendMail import sendMail
+
+        logging.info("Sending %d new routines to support mail...", len(routines))
         result = sendMail(routines)
         if result:
             logging.info("Mail sent successfully!")
         else:
             logging.info("Failed to send mail")
     except Exception as e:
-        logging.info(f"Error sending mail: {str(e)}")
+        logging.info("Error sending mail: %s", e)
         traceback.print_exc()
 
 
@@ -147,58 +174,96 @@ def test_rss_feed():
     rss_url = "https://quality.k2kompetanse.no/feed/?post_type=kurs"
 
     try:
-        logging.info(f"Fetching RSS feed: {rss_url}")
-        feed = feedparser.parse(rss_url)
+        import requests
+        from lxml import etree
+
+        # Load the cached IDs once and use O(1) set lookups for every entry
+        init_database()
+        cached_ids = lastroutine()
+
+        logging.info("Fetching RSS feed: %s", rss_url)
+        # Send the validators from the previous fetch so an unchanged feed
+        # answers 304 and we skip parsing entirely
+        feed_meta = get_feed_meta()
+        conditional_headers = {}
+        if feed_meta.get('etag'):
+            conditional_headers['If-None-Match'] = feed_meta['etag']
+        if feed_meta.get('last_modified'):
+            conditional_headers['If-Modified-Since'] = feed_meta['last_modified']
+
+        # Stream the response and pull <item> elements as they arrive -
+        # the feed only needs title/guid/pubDate, so feedparser's full
+        # document build and HTML sanitiser are skipped entirely
+        response = requests.get(rss_url, stream=True, timeout=10, headers=conditional_headers)
+        if response.status_code == 304:
+            logging.info("Feed unchanged since last run (HTTP 304), nothing to do")
+            return
+        response.raise_for_status()
+        response.raw.decode_content = True
 
-        if feed.bozo:
-            logging.info(f"RSS feed parsing warning: {feed.bozo_exception}")
+        new_routines = []
+        all_routines = []
 
-        logging.info(f"Feed Information:")
-        logging.info(f"  Title: {feed.feed.get('title', 'No title')}")
-        logging.info(f"  Last updated: {feed.feed.get('lastbuilddate', 'Unknown')}")
-        logging.info(f"  Total entries: {len(feed.entries)}")
+        # One clock read for the whole run instead of one per entry
+        now_norwegian = datetime.now(NORWEGIAN_TIMEZONE)
 
-        if len(feed.entries) == 0:
-            logging.info("No entries found in the RSS feed")
-            return
+        i = 0
+        for _, item in etree.iterparse(response.raw, tag='item'):
+            i += 1
+            if i > MAX_ENTRIES:
+                break
 
-        logging.info(f"Processing {len(feed.entries)} routines:")
-        logging.info("-" * 30)
+            entry = {
+                'title': item.findtext('title') or '',
+                'id': item.findtext('guid') or item.findtext('link') or '',
+                'published': item.findtext('pubDate'),
+            }
+            item.clear()  # free the parsed element right away
 
-        new_routines = []
-        all_routines = []
+            logging.debug("%d. Processing routine...", i)
 
-        for i, entry in enumerate(feed.entries, 1):
-            logging.info(f"{i}. Processing routine...")
-            routine_data = format_course_data(entry)
+            # Check the ID against the cache first, so entries we have
+            # already seen only pay for a regex instead of full formatting
+            numeric_id = _extract_post_id(entry['id'])
+            if numeric_id in cached_ids:
+                logging.info("  This routine is already processed, stopping process...")
+                break
+
+            routine_data = format_course_data(entry, now_norwegian)
             all_routines.append(routine_data)
-            logging.info(f"  Title: {routine_data['title']}")
-            logging.info(f"  Published: {routine_data['published_norwegian']}")
-            logging.info(f"  URL: {routine_data['search_url']}")
+            logging.debug("  Title: %s", routine_data['title'])
+            logging.debug("  Published: %s", routine_data['published_norwegian'])
+            logging.debug("  URL: %s", routine_data['search_url'])
 
-            if is_new_routine(routine_data):
+            if is_new_routine(routine_data, cached_ids):
                 new_routines.append(routine_data)
+                cached_ids.add(routine_data['id'])
                 logging.info("  This routine is NEW!")
-            else:
-                logging.info("  This routine is already processed, stopping process...")
-                break
 
-        logging.info(f"Summary:")
-        logging.info(f"  Total routines Checked: {len(all_routines)}")
-        logging.info(f"  New routines: {len(new_routines)}")
+        if i == 0:
+            logging.info("No entries found in the RSS feed")
+            return
+
+        # One transaction for the whole batch instead of a commit per routine
+        updatecache_bulk([routine['id'] for routine in new_routines])
+        set_feed_meta(response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        logging.info("Summary:")
+        logging.info("  Total routines Checked: %d", len(all_routines))
+        logging.info("  New routines: %d", len(new_routines))
 
         if new_routines:
-            logging.info(f"New routines found:")
+            logging.info("New routines found:")
             for routine in new_routines:
-                logging.info(f"  - {routine['title']} ({routine['published_norwegian']})")
-            logging.info(f"Sending all new routines in one mail")
+                logging.info("  - %s (%s)", routine['title'], routine['published_norwegian'])
+            logging.info("Sending all new routines in one mail")
             callMailFunction(new_routines)
         else:
-            logging.info(f"No new routines to post")
+            logging.info("No new routines to post")
 
-        logging.info(f"Test completed successfully!")
+        logging.info("Test completed successfully!")
     except Exception as e:
-        logging.info(f"Error processing RSS feed: {str(e)}")
+        logging.info("Error processing RSS feed: %s", e)
         traceback.print_exc()
 
 
@@ -212,37 +277,25 @@ def is_about_to_expire():
             logging.info("CLIENT_SECRET_EXPIRATION_DATE not set in .env")
             return False
 
-        # Remove quotes if present and parse with correct format
-        expiration_date = expiration_date.strip('"')
-        expiration_datetime = datetime.strptime(expiration_date, '%m/%d/%Y')
-        current_datetime = datetime.now()
-
-        time_diff = expiration_datetime - current_datetime
-        hours_until_expiration = time_diff.total_seconds() / 3600
-        logging.info(f"Client secret expires in {time_diff.days} days, {hours_until_expiration:.1f} hours")
-
-        should_notify = False
+        # The expiration is a date, so plain ordinal-day arithmetic is
+        # enough - no timedelta floats or DST concerns
+        days_until_expiration = (_parse_expiration_date(expiration_date).date().toordinal()
+                                 - date.today().toordinal())
+        logging.info("Client secret expires in %d days", days_until_expiration)
 
-        # 2.5 weeks to 3.5 weeks warning window
-        if EXPIRATION_WARNING_3_WEEKS_MIN <= hours_until_expiration <= EXPIRATION_WARNING_3_WEEKS_MAX:
-            should_notify = True
-            logging.info(f"3 week expiration warning triggered ({time_diff.days} days remaining)")
-
-        # 1.5 weeks to 2.5 weeks warning window
-        elif EXPIRATION_WARNING_2_WEEKS_MIN <= hours_until_expiration <= EXPIRATION_WARNING_3_WEEKS_MIN:
-            should_notify = True
-            logging.info(f"2 week expiration warning triggered ({time_diff.days} days remaining)")
-
-        # Under 1.5 weeks - critical warning
-        elif hours_until_expiration < EXPIRATION_WARNING_CRITICAL:
-            should_notify = True
-            logging.info(f"Under 1.5 week expiration warning triggered ({hours_until_expiration:.1f} hours remaining)")
+        # All three old warning windows collapse into one upper bound
+        should_notify = days_until_expiration <= EXPIRATION_WARNING_3_WEEKS_MAX
 
         if should_notify:
+            label = next(label for threshold, label in _EXPIRATION_WARNING_LEVELS
+                         if days_until_expiration >= threshold)
+            logging.info("%s expiration warning triggered (%d days remaining)", label, days_until_expiration)
+            from sendMail import ChangeClientSecret
+
             if ChangeClientSecret():
                 logging.info("Request for client secret change successfully sent")
         return should_notify
 
     except Exception as e:
-        logging.info(f"Error checking client secret expiration: {str(e)}")
+        logging.info("Error checking client secret expiration: %s", e)
         return False
@@ -2,12 +2,67 @@ import msal
 import requests
 from dotenv import load_dotenv
 import os
+import atexit
+from html import escape
+from functools import lru_cache
 from datetime import datetime, timezone, timedelta
+from babel import Locale
 from babel.dates import format_date
 import logging
 
 load_dotenv()
 
+# Parse the Norwegian locale once; format_date then skips locale resolution
+_NB_LOCALE = Locale.parse('nb')
+
+# Static pieces of the routine notification mail, built once at import
+_MAIL_HEADER = """
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <div style="background-color: #DAAA00; color: white; padding: 20px; text-align: center;">
+                <h1 style="margin: 0; font-size: 24px;">K2 Quality</h1>
+            </div>
+            <div style="padding: 20px; background-color: #f9f9f9;">
+                <h2 style="color: black; margin-top: 0;">{header_text}</h2>
+        """
+
+_ROUTINE_ITEM = """
+                <div style="background-color: white; border-left: 4px solid #DAAA00; padding: 15px; margin-bottom: 15px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
+                    <h3 style="margin: 0 0 10px 0; color: #333;">{title}</h3>
+                    <p style="margin: 5px 0; color: #666;">Publisert: {formatted_date}</p>
+                    <a href="{search_url}" style="display: inline-block; background-color: #DAAA00; color: white; padding: 8px 16px; text-decoration: none; border-radius: 4px; margin-top: 10px;">Se rutinen</a>
+                </div>
+            """
+
+_MAIL_FOOTER = """
+            </div>
+            <div style="padding: 15px; text-align: center; color: #666; font-size: 12px;">
+                <p>Dette er en automatisk generert e-post fra K2 Quality rutineovervåking.</p>
+            </div>
+        </div>
+        """
+
+# One HTTP session per process so Graph calls share a pooled TLS connection
+# instead of paying a new handshake per request
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=4,
+            max_retries=requests.adapters.Retry(
+                total=3, backoff_factor=0.5,
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=['POST'],
+            ),
+        )
+        _session.mount('https://', adapter)
+        atexit.register(_session.close)
+    return _session
+
 CONFIG = {
     "tenantId": os.getenv("TENANT_ID"),
     "clientId": os.getenv("CLIENT_ID"),
@@ -16,18 +71,30 @@ CONFIG = {
     "scopes": ["https://graph.microsoft.com/.default"],
 }
 
+# The MSAL app carries the in-memory token cache, so one instance per
+# process means acquire_token_for_client reuses tokens until they expire
+_app = None
+
+
+def _get_app():
+    global _app
+    if _app is None:
+        _app = msal.ConfidentialClientApplication(
+            client_id=CONFIG["clientId"],
+            client_credential=CONFIG["clientSecret"],
+            authority=CONFIG["authority"],
+            # Token endpoint calls reuse the pooled Graph session
+            http_client=_get_session()
+        )
+    return _app
+
+
 def get_access_token():
     """
     Get access token using MSAL client credentials flow
     """
     try:
-        app = msal.ConfidentialClientApplication(
-            client_id=CONFIG["clientId"],
-            client_credential=CONFIG["clientSecret"],
-            authority=CONFIG["authority"]
-        )
-
-        result = app.acquire_token_for_client(scopes=CONFIG["scopes"])
+        result = _get_app().acquire_token_for_client(scopes=CONFIG["scopes"])
         if result and "access_token" in result:
             logging.info("Access token acquired successfully")
             return result["access_token"]
@@ -60,32 +127,15 @@ def sendMail(routines):
             subject = "K2 Quality: 1 ny rutine publisert"
             header_text = "1 ny rutine opprettet siste uken"
 
-        # Build HTML body with styling
-        body = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background-color: #DAAA00; color: white; padding: 20px; text-align: center;">
-                <h1 style="margin: 0; font-size: 24px;">K2 Quality</h1>
-            </div>
-            <div style="padding: 20px; background-color: #f9f9f9;">
-                <h2 style="color: black; margin-top: 0;">{header_text}</h2>
-        """
-
-        for routine in routines:
-            body += f"""
-                <div style="background-color: white; border-left: 4px solid #DAAA00; padding: 15px; margin-bottom: 15px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-                    <h3 style="margin: 0 0 10px 0; color: #333;">{routine['title']}</h3>
-                    <p style="margin: 5px 0; color: #666;">Publisert: {routine['formatted_date']}</p>
-                    <a href="{routine['search_url']}" style="display: inline-block; background-color: #DAAA00; color: white; padding: 8px 16px; text-decoration: none; border-radius: 4px; margin-top: 10px;">Se rutinen</a>
-                </div>
-            """
-
-        body += """
-            </div>
-            <div style="padding: 15px; text-align: center; color: #666; font-size: 12px;">
-                <p>Dette er en automatisk generert e-post fra K2 Quality rutineovervåking.</p>
-            </div>
-        </div>
-        """
+        # Build HTML body from the static templates in one join
+        body = _MAIL_HEADER.format(header_text=header_text) + ''.join(
+            _ROUTINE_ITEM.format(
+                title=escape(routine['title']),
+                formatted_date=routine['formatted_date'],
+                search_url=routine['search_url'],
+            )
+            for routine in routines
+        ) + _MAIL_FOOTER
 
         email_data = {
             "message": {
@@ -111,7 +161,7 @@ def sendMail(routines):
             "Content-Type": "application/json"
         }
 
-        response = requests.post(endpoint, headers=headers, json=email_data)
+        response = _get_session().post(endpoint, headers=headers, json=email_data)
         logging.info(response)
         if response.status_code == 202:
             logging.info("Email sent successfully")
@@ -124,19 +174,25 @@ def sendMail(routines):
         return False
 
 
+@lru_cache(maxsize=1)
+def _parse_expiration_date(raw):
+    """
+    Strip quotes and parse the .env date format once per distinct value.
+    """
+    return datetime.strptime(raw.strip('"'), '%m/%d/%Y')
+
+
 def ChangeClientSecret():
     """
     Send mail to tell that the client secret is about to expire
     """
 
-    expiration_date_str = os.getenv('CLIENT_SECRET_EXPIRATION_DATE')
-    expiration_date_str = expiration_date_str.strip('"')  # Remove quotes
-    expiration_date = datetime.strptime(expiration_date_str, '%m/%d/%Y')  # Parse from .env format
+    expiration_date = _parse_expiration_date(os.getenv('CLIENT_SECRET_EXPIRATION_DATE'))
 
     formatted_exp_date = format_date(
         expiration_date,
         format='d. MMM yyyy',
-        locale='nb'
+        locale=_NB_LOCALE
     )
 
     try:
@@ -198,7 +254,7 @@ def ChangeClientSecret():
             "Content-Type": "application/json"
         }
 
-        response = requests.post(endpoint, headers=headers, json=email_data)
+        response = _get_session().post(endpoint, headers=headers, json=email_data)
 
         if response.status_code == 202:
             logging.info("Email sent successfully")